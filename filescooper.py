@@ -2,18 +2,32 @@
 import os
 import argparse
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.exceptions import IncompleteRead, HTTPError as Urllib3Error
 import time
 import random
+import threading
+import queue
+import mmap
+import sys
+import tempfile
 from urllib.parse import urlparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from tqdm import tqdm, TqdmExperimentalWarning
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
-import warnings
-
-warnings.filterwarnings("ignore", category=TqdmExperimentalWarning)
 
 DESKTOP_USER_AGENTS = ['Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36', 'Mozilla/5.0 (Macintosh; Intel Mac OS X 13_4) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.4 Safari/605.1.15', 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36', 'Mozilla/5.0 (Windows NT 10.0; rv:115.0) Gecko/20100101 Firefox/115.0', 'Mozilla/5.0 (Macintosh; Intel Mac OS X 12_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.0 Safari/605.1.15']
 MOBILE_USER_AGENTS = ['Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1', 'Mozilla/5.0 (Linux; Android 13; Pixel 6) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Mobile Safari/537.36', 'Mozilla/5.0 (Linux; Android 12; SM-G991B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Mobile Safari/537.36', 'Mozilla/5.0 (iPad; CPU OS 16_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.0 Mobile/15E148 Safari/604.1']
+CHUNK_SIZE = 64 * 1024
+MMAP_THRESHOLD = 32 * 1024 * 1024
+LOG_BATCH = 64
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_AFTER_MAX = 10
+# Network errors raised while reading a body, which download_file retries itself
+BODY_ERRORS = (requests.RequestException, Urllib3Error)
+# Read access as well so large downloads can be written through mmap
+WRITE_FLAGS = os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0) | getattr(os, 'O_CLOEXEC', 0)
 
 def parse_headers(header_list):
     headers = {}
@@ -23,6 +37,16 @@ def parse_headers(header_list):
             headers[key.strip()] = value.strip()
     return headers
 
+def build_header_variants(headers, random_ua=False):
+    # One ready-made headers dict per User-Agent, so workers only pick one
+    if random_ua == 'desktop':
+        user_agents = DESKTOP_USER_AGENTS
+    elif random_ua == 'mobile':
+        user_agents = MOBILE_USER_AGENTS
+    else:
+        return (headers,)
+    return tuple(dict(headers, **{'User-Agent': ua}) for ua in user_agents)
+
 def read_urls_from_file(filepath):
     try:
         with open(filepath, 'r') as f:
@@ -45,30 +69,83 @@ class Color:
             self.YELLOW = ""
             self.RED = ""
             self.RESET = ""
+        # Status code -> color lookup table, so colorizing a response is one index
+        self.STATUS = [self.RED] * 600
+        self.STATUS[200:300] = [self.GREEN] * 100
+        self.STATUS[300:400] = [self.YELLOW] * 100
 
 def colorize_status(code, color):
-    if 200 <= code < 300:
-        return f"{color.GREEN}{code}{color.RESET}"
-    elif 300 <= code < 400:
-        return f"{color.YELLOW}{code}{color.RESET}"
-    else:
-        return f"{color.RED}{code}{color.RESET}"
-
-def get_unique_filename(output_dir, base_filename):
-    base, ext = os.path.splitext(base_filename)
-    counter = 1
-    unique_filename = base_filename
-    while os.path.exists(os.path.join(output_dir, unique_filename)):
-        unique_filename = f"{base}_{counter}{ext}"
-        counter += 1
-    return unique_filename
-
-def allowed_extension(filename, allowed_types):
-    if allowed_types == {"*"}:
-        return True
-    ext = os.path.splitext(filename)[1].lower().lstrip('.')
-    return ext in allowed_types
-
+    tint = color.STATUS[code] if 0 <= code < 600 else color.RED
+    return f"{tint}{code}{color.RESET}"
+
+def is_case_insensitive(directory):
+    # Create a mixed-case temp file and look it up lowercased (macOS and Windows defaults)
+    with tempfile.NamedTemporaryFile(prefix='.FileScooper-', dir=directory) as probe:
+        return os.path.exists(os.path.join(directory, os.path.basename(probe.name).lower()))
+
+class FilenameReserver:
+    def __init__(self, output_dir):
+        # One directory listing up front; after that uniqueness is a set lookup.
+        # Names are compared case-folded when the filesystem would treat them as one file.
+        self.key = str.casefold if is_case_insensitive(output_dir) else str
+        self.taken = {self.key(name) for name in os.listdir(output_dir)}
+        self.lock = threading.Lock()
+
+    def reserve(self, base_filename):
+        base, ext = os.path.splitext(base_filename)
+        counter = 1
+        unique_filename = base_filename
+        with self.lock:
+            while self.key(unique_filename) in self.taken:
+                unique_filename = f"{base}_{counter}{ext}"
+                counter += 1
+            self.taken.add(self.key(unique_filename))
+        return unique_filename
+
+    def release(self, filename):
+        with self.lock:
+            self.taken.discard(self.key(filename))
+
+def make_extension_filter(allowed_types):
+    if "*" in allowed_types:
+        return lambda filename: True
+
+    def allowed_extension(filename):
+        _, dot, ext = filename.rpartition('.')
+        return bool(dot) and ext.lower() in allowed_types
+    return allowed_extension
+
+
+class Progress:
+    def __init__(self, total, interval=0.2, stream=sys.stderr):
+        # The main loop only bumps a counter; a daemon thread redraws on a timer
+        self.total = total
+        self.done = 0
+        self.interval = interval
+        self.stream = stream
+        self.start = time.monotonic()
+        self.stopped = threading.Event()
+        self.thread = None
+        if stream.isatty():
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def _draw(self):
+        elapsed = time.monotonic() - self.start
+        rate = self.done / elapsed if elapsed else 0.0
+        self.stream.write(f"\r⏳ Progress {self.done}/{self.total} [{elapsed:.0f}s @ {rate:.1f} file/s]")
+        self.stream.flush()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self._draw()
+
+    def close(self):
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+            self._draw()
+            self.stream.write("\n")
 
 def format_size(num_bytes):
     for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
@@ -94,53 +171,256 @@ def parse_size(size_str):
         size_str = size_str[:-2]
     return int(float(size_str) * multiplier)
 
-def download_file(url, headers, output_dir, proxies=None, retries=3, color=None, allowed_types=None, min_size=None, max_size=None, random_ua=False):
+class BoundedRetry(Retry):
+    # urllib3 sleeps on the calling worker thread between attempts, so a server's
+    # Retry-After is only honoured up to RETRY_AFTER_MAX seconds. HEAD size probes
+    # are best-effort and are never retried; the GET that follows has its own retries.
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, RETRY_AFTER_MAX)
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        return method != 'HEAD' and super().is_retry(method, status_code, has_retry_after)
+
+    def increment(self, method=None, *args, **kwargs):
+        if method == 'HEAD':
+            return Retry.increment(self.new(total=0), method, *args, **kwargs)
+        return super().increment(method, *args, **kwargs)
+
+def create_retry(retries):
+    options = dict(total=max(retries - 1, 0), backoff_factor=0.3, status_forcelist=RETRY_STATUSES,
+                   respect_retry_after_header=True, raise_on_status=False)
+    try:
+        return BoundedRetry(backoff_jitter=0.3, **options)
+    except TypeError:  # urllib3 < 2.0 has no backoff_jitter
+        return BoundedRetry(**options)
+
+def create_session(pool_connections, pool_maxsize, retries=3):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=create_retry(retries))
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def prepare_tasks(urls, allowed_extension):
+    # Parse each URL once up front so rejected ones never reach a worker
+    tasks, skipped = [], []
+    for url in urls:
+        parsed_url = urlparse(url)
+        filename = os.path.basename(parsed_url.path)
+        if not filename:
+            skipped.append(f"[!] Skipped (no filename): {url}")
+        elif not allowed_extension(filename):
+            skipped.append(f"[!] Skipped (not allowed type): {url}")
+        else:
+            tasks.append((url, parsed_url.netloc, filename))
+    return tasks, skipped
+
+def run_by_host(executor, worker, tasks, per_host):
+    # One queue per host with at most per_host of its URLs in flight; a host's
+    # next URL is only submitted when one of its own finishes, so pool threads
+    # never sit blocked waiting for a busy host. Yields results as they finish.
+    queues = defaultdict(deque)
+    for task in tasks:
+        queues[task[1]].append(task)
+    in_flight = {}
+
+    def submit(host):
+        url, _, filename = queues[host].popleft()
+        in_flight[executor.submit(worker, url, filename)] = host
+
+    # Fill the executor round-robin so the first free threads spread across hosts
+    for _ in range(per_host):
+        for host, pending in queues.items():
+            if pending:
+                submit(host)
+
+    while in_flight:
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            host = in_flight.pop(future)
+            if queues[host]:
+                submit(host)
+            yield future.result()
+
+def probe_size(session, url, headers, proxies=None):
+    # HEAD the URL so size limits can be applied without opening a body stream.
+    # Returns None when the size is unknown or only known for an encoded body.
+    # Some dynamic servers answer HEAD with Content-Length: 0, so 0 counts as unknown.
+    try:
+        response = session.head(url, headers=headers, timeout=15, allow_redirects=True, proxies=proxies, verify=False)
+    except requests.RequestException:
+        return None
+    if not response.ok or 'Content-Encoding' in response.headers:
+        return None
+    try:
+        return int(response.headers.get('Content-Length', '')) or None
+    except ValueError:
+        return None
+
+def map_body(response, fd, size):
+    # Size the file up front and copy the body into a shared mapping one
+    # CHUNK_SIZE window at a time (urllib3's readinto reads a temporary bytes
+    # object of the window's length, so the window bounds memory use); the
+    # kernel writes the dirty pages back while the download carries on.
+    # A body that ends early is an error on every urllib3 version (2.x raises on
+    # its own; 1.x just returns 0), so the caller discards the partial file.
+    os.ftruncate(fd, size)
+    offset = 0
+    with mmap.mmap(fd, size) as mapping:
+        with memoryview(mapping) as view:
+            while offset < size:
+                with view[offset:offset + CHUNK_SIZE] as window:
+                    n = response.raw.readinto(window)
+                if not n:
+                    raise IncompleteRead(offset, size - offset)
+                offset += n
+    return offset
+
+def stream_body(response, fd, max_size=None):
+    # Copy the body into fd and return its size. Stops early once max_size is passed.
+    if 'Content-Encoding' not in response.headers:
+        expected = int(response.headers.get('Content-Length') or 0)
+        if expected >= MMAP_THRESHOLD and not (max_size and expected > max_size):
+            return map_body(response, fd, expected)
+
+    content_length = 0
+    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+        content_length += len(chunk)
+        if max_size and content_length > max_size:
+            break
+        write_all(fd, chunk)
+    return content_length
+
+def download_file(url, filename, session, pick_headers, output_dir, reserver, proxies=None, retries=3, color=None, min_size=None, max_size=None):
+    headers = pick_headers()
+
+    if min_size or max_size:
+        advertised = probe_size(session, url, headers, proxies)
+        if advertised is not None:
+            if max_size and advertised > max_size:
+                return f"[!] Skipped (too large > {format_size(max_size)}): {url}", None, 0
+            if min_size and advertised < min_size:
+                return f"[!] Skipped (too small < {format_size(min_size)}): {url}", None, 0
+
+    # Connect and status failures are retried inside urllib3 (BoundedRetry); a body
+    # that breaks off after the headers arrived is retried here instead.
     for attempt in range(1, retries + 1):
+        filepath = None
+        receiving = False
         try:
-            if random_ua == 'desktop':
-                headers['User-Agent'] = random.choice(DESKTOP_USER_AGENTS)
-            elif random_ua == 'mobile':
-                headers['User-Agent'] = random.choice(MOBILE_USER_AGENTS)
+            with session.get(url, headers=headers, timeout=15, stream=True, proxies=proxies, verify=False) as response:
+                status_colored = colorize_status(response.status_code, color)
+
+                # Reject on the advertised size before any of the body is transferred.
+                # A compressed body only gets bigger once decoded, so min_size has to wait.
+                expected = int(response.headers.get('Content-Length') or 0)
+                if max_size and expected > max_size:
+                    return f"[!] Skipped (too large > {format_size(max_size)}): {url}", None, 0
+                if min_size and expected and expected < min_size and 'Content-Encoding' not in response.headers:
+                    return f"[!] Skipped (too small < {format_size(min_size)}): {url}", None, 0
+
+                unique_name = reserver.reserve(filename)
+                filepath = os.path.join(output_dir, unique_name)
+                receiving = True
+
+                fd = os.open(filepath, WRITE_FLAGS, 0o644)
+                try:
+                    content_length = stream_body(response, fd, max_size)
+                finally:
+                    os.close(fd)
 
-            response = requests.get(url, headers=headers, timeout=15, proxies=proxies, verify=False)
-            status_colored = colorize_status(response.status_code, color)
-
-            content_length = len(response.content)
-            if min_size and content_length < min_size:
-                return f"[!] Skipped (too small < {format_size(min_size)}): {url}"
             if max_size and content_length > max_size:
-                return f"[!] Skipped (too large > {format_size(max_size)}): {url}"
-
-
-            parsed_url = urlparse(url)
-            filename = os.path.basename(parsed_url.path)
-
-            if not filename:
-                return f"[!] Skipped (no filename): {url}"
-
-            if not allowed_extension(filename, allowed_types):
-                return f"[!] Skipped (not allowed type): {url}"
-
-            os.makedirs(output_dir, exist_ok=True)
-            filename = get_unique_filename(output_dir, filename)
-            filepath = os.path.join(output_dir, filename)
+                os.remove(filepath)
+                reserver.release(unique_name)
+                return f"[!] Skipped (too large > {format_size(max_size)}): {url}", None, 0
+            if min_size and content_length < min_size:
+                os.remove(filepath)
+                reserver.release(unique_name)
+                return f"[!] Skipped (too small < {format_size(min_size)}): {url}", None, 0
 
-            with open(filepath, 'wb') as f:
-                f.write(response.content)
-            size_str = format_size(len(response.content))
-            return f"[✓] {filename:<30} → {status_colored} ({size_str})  ({url})", response.status_code, content_length
+            size_str = format_size(content_length)
+            return f"[✓] {unique_name:<30} → {status_colored} ({size_str})  ({url})", response.status_code, content_length
         except Exception as e:
-            if attempt < retries:
-                time.sleep(2 ** attempt)
-            else:
-                return f"[✗] Failed to download {url} after {retries} attempt(s): {e}"
+            if filepath:
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+                reserver.release(unique_name)
+            if not receiving:
+                return f"[✗] Failed to download {url}: {e}", None, 0
+            if attempt < retries and isinstance(e, BODY_ERRORS):
+                time.sleep(min(0.3 * 2 ** attempt, RETRY_AFTER_MAX))
+                continue
+            return f"[✗] Failed to download {url} after {attempt} attempt(s): {e}", None, 0
+
+def write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+class LogWriter:
+    def __init__(self, path):
+        self.name = path
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_CLOEXEC', 0), 0o644)
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def write(self, line):
+        self.queue.put(line)
+
+    def _run(self):
+        # Drain up to LOG_BATCH lines at a time and hand them to one writev call
+        done = False
+        while not done:
+            lines = [self.queue.get()]
+            while len(lines) < LOG_BATCH:
+                try:
+                    lines.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in lines:
+                done = True
+                lines = lines[:lines.index(None)]
+            if lines:
+                self._flush([f"{line}\n".encode('utf-8') for line in lines])
+
+    def _flush(self, chunks):
+        if hasattr(os, 'writev'):
+            written = os.writev(self.fd, chunks)
+            if written < sum(map(len, chunks)):
+                write_all(self.fd, b"".join(chunks)[written:])
+        else:
+            write_all(self.fd, b"".join(chunks))
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        os.close(self.fd)
+
+def make_worker(session, header_variants, output_dir, reserver, proxies=None, retries=3, color=None, min_size=None, max_size=None):
+    # Bind everything that is fixed for the run once; workers only take the URL
+    if len(header_variants) == 1:
+        fixed_headers = header_variants[0]
+        pick_headers = lambda: fixed_headers
+    else:
+        pick_headers = lambda: random.choice(header_variants)
+
+    def worker(url, filename):
+        return download_file(url, filename, session, pick_headers, output_dir, reserver,
+                             proxies, retries, color, min_size, max_size)
+    return worker
 
 def setup_log_file(log_path=None):
-    os.makedirs("logs", exist_ok=True)
     if not log_path:
         timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         log_path = os.path.join("logs", f"filescooper_{timestamp}.log")
-    return open(log_path, 'w', encoding='utf-8')
+    log_dir = os.path.dirname(log_path)
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+    return LogWriter(log_path)
 
 def main():
     parser = argparse.ArgumentParser(description="📦 FileScooper - Flexible multithreaded downloader for JS/CSS/images/binaries.")
@@ -149,7 +429,8 @@ def main():
     parser.add_argument('-o', '--output', default='downloads', help='Directory to save the downloaded files')
     parser.add_argument('-H', '--header', action='append', default=[], help='Custom header (e.g., "Cookie: foo=bar")')
     parser.add_argument('-x', '--proxy', help='Proxy server (e.g., http://127.0.0.1:8080)')
-    parser.add_argument('-t', '--threads', type=int, default=5, help='Number of parallel download threads')
+    parser.add_argument('-t', '--threads', type=int, help='Number of parallel download threads (default: 4 per host, up to 64)')
+    parser.add_argument('--per-host', type=int, default=4, help='Maximum concurrent downloads per host')
     parser.add_argument('--retries', type=int, default=3, help='Number of retry attempts per failed download')
     parser.add_argument('--log-file', help='Path to log file (default: logs/filescooper_TIMESTAMP.log)')
     parser.add_argument('--no-color', action='store_true', help='Disable colored output')
@@ -163,7 +444,7 @@ def main():
     headers = parse_headers(args.header)
     proxies = {'http': args.proxy, 'https': args.proxy} if args.proxy else None
     color = Color(enable=not args.no_color)
-    allowed_types = {t.strip().lower() for t in args.types.split(',')}
+    allowed_types = frozenset(t.strip().lower().lstrip('.') for t in args.types.split(','))
 
     urls = args.urls or []
     if args.file:
@@ -185,27 +466,43 @@ def main():
         print("[!] No URLs provided. Use -u or -f.")
         return
 
+    unique_urls = list(dict.fromkeys(urls))
+    if len(unique_urls) < len(urls):
+        print(f"[!] Dropped {len(urls) - len(unique_urls)} duplicate URL(s)")
+        urls = unique_urls
+
+    tasks, results = prepare_tasks(urls, make_extension_filter(allowed_types))
+    hosts = {host for _, host, _ in tasks}
+    per_host = max(1, args.per_host)
+    if not args.threads:
+        args.threads = max(1, min(64, per_host * len(hosts)))
+
     print(f"\n📥 Downloading {len(urls)} file(s) with {args.threads} threads...\n")
     log_file = setup_log_file(args.log_file)
-    results = []
+    for result in results:
+        log_file.write(result)
+
+    header_variants = build_header_variants(headers, 'desktop' if args.random_useragent else ('mobile' if args.mobile_useragent else False))
+    # Only keep as many host pools as can be busy at once; the adapter's LRU closes
+    # idle sockets of finished hosts instead of holding one set per host open.
+    # Plain-HTTP requests through a proxy all share the proxy's pool, so size it for every thread.
+    session = create_session(max(1, min(len(hosts), args.threads)), args.threads if proxies else per_host,
+                             args.retries)
+    os.makedirs(args.output, exist_ok=True)
+    reserver = FilenameReserver(args.output)
+
+    worker = make_worker(session, header_variants, args.output, reserver, proxies, args.retries, color, min_size, max_size)
 
     with ThreadPoolExecutor(max_workers=args.threads) as executor:
-        futures = [
-        executor.submit(download_file, url, headers.copy(), args.output, proxies, args.retries,
-                        color, allowed_types, min_size, max_size,
-                        'desktop' if args.random_useragent else ('mobile' if args.mobile_useragent else False))
-        for url in urls
-        ]
-
-        with tqdm(total=len(futures), desc="⏳ Progress", ncols=100, unit="file") as progress_bar:
-            for future in as_completed(futures):
-                result, status, size = future.result()
-                results.append(result)
-                log_file.write(result + '\n')
-                if status == 200 and size > 0:  
-                    total_downloaded += 1
-                    total_bytes += size
-                progress_bar.update(1)  # ✅ Live update here
+        progress = Progress(len(tasks))
+        for result, status, size in run_by_host(executor, worker, tasks, per_host):
+            results.append(result)
+            log_file.write(result)
+            if status == 200 and size > 0:
+                total_downloaded += 1
+                total_bytes += size
+            progress.done += 1
+        progress.close()
         print("\n✔️ Finalizing summary...\n")
         
     successes = [r for r in results if r.startswith("[✓]")]
@@ -232,6 +529,7 @@ def main():
             print(r)
         print()
 
+    session.close()
     log_file.close()
     print(f"📁 Saved to: {args.output}/")
     print(f"📝 Log saved to: {log_file.name}")